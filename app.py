@@ -7,6 +7,8 @@ from earthquake import get_earthquake_risk
 # from fire import get_fire_risk
 from preparedness import generate_preparation_checklist, calculate_preparedness_score
 from defaults import SAMPLE_USER_PROFILE
+from scheduler import RiskRefreshScheduler
+from models import FamilyMember, UserProfile
 from utils import get_color_preparedness_score, get_color_risk_level, colored_text
 
 # Setup OpenAI API client
@@ -19,17 +21,25 @@ gmaps_client = googlemaps.Client(
     key=st.secrets["GOOGLE_MAPS_API_KEY"],
 )
 
+
+@st.cache_resource
+def get_risk_scheduler():
+    # Shared across sessions, keeps the risk results of analyzed households fresh in the background
+    risk_scheduler = RiskRefreshScheduler(
+        openai_client,
+        gmaps_client,
+        hazards=("flood", "earthquake"),
+    )
+    risk_scheduler.start()
+    return risk_scheduler
+
+risk_scheduler = get_risk_scheduler()
+
 if "user_profile" not in st.session_state:
-    st.session_state["user_profile"] = {
-        "household_name": "",
-        "address": "",
-        "family_members": [],
-        "flood_risk": {},
-        "earthquake_risk": {},
-    }
+    st.session_state["user_profile"] = UserProfile()
 
 if "preparedness_checklist" not in st.session_state:
-    st.session_state["preparedness_checklist"] = {}
+    st.session_state["preparedness_checklist"] = []
 
 
 if "show_family_members" not in st.session_state:
@@ -46,8 +56,8 @@ def main():
     # Sidebar contains the user profile
     with st.sidebar:
         st.title("User Profile")
-        st.session_state["user_profile"]["household_name"] = st.text_input("Household Name", value=st.session_state.user_profile["household_name"])
-        st.session_state["user_profile"]["address"] = st.text_input("Address", value=st.session_state.user_profile["address"])
+        st.session_state["user_profile"].household_name = st.text_input("Household Name", value=st.session_state.user_profile.household_name)
+        st.session_state["user_profile"].address = st.text_input("Address", value=st.session_state.user_profile.address)
         
         # Family Members
         st.subheader("Family Members")
@@ -67,29 +77,29 @@ def main():
         if st.button("Add Family Member", disabled=not st.session_state["add_family_member"]):
             st.session_state["add_family_member"] = False
 
-            st.session_state["user_profile"]["family_members"].append({
-                "name": name,
-                "contact_number": contact_number,
-                "email": email,
-                "age": age,
-                "mobility_needs": mobility_needs,
-                "medication": medication
-            })
+            st.session_state["user_profile"].family_members.append(FamilyMember(
+                name=name,
+                contact_number=contact_number,
+                email=email,
+                age=age,
+                mobility_needs=mobility_needs,
+                medication=medication
+            ))
 
         if st.button("Use sample profile"):
             # Load a sample user profile
-            st.session_state["user_profile"] = SAMPLE_USER_PROFILE.copy()
+            st.session_state["user_profile"] = UserProfile.from_dict(SAMPLE_USER_PROFILE)
 
         # Show family members
         st.session_state["show_family_members"] = st.checkbox("Show Family Members", value=False)
         if st.session_state["show_family_members"]:
-            for member in st.session_state["user_profile"]["family_members"]:
-                st.write(f"Name: {member['name']}")
-                st.write(f"Contact Number: {member['contact_number']}")
-                st.write(f"Email: {member['email']}")
-                st.write(f"Age: {member['age']}")
-                st.write(f"Mobility Needs: {member['mobility_needs']}")
-                st.write(f"Medication: {member['medication']}")
+            for member in st.session_state["user_profile"].family_members:
+                st.write(f"Name: {member.name}")
+                st.write(f"Contact Number: {member.contact_number}")
+                st.write(f"Email: {member.email}")
+                st.write(f"Age: {member.age}")
+                st.write(f"Mobility Needs: {member.mobility_needs}")
+                st.write(f"Medication: {member.medication}")
                 st.write("---")
 
 
@@ -101,61 +111,63 @@ def main():
     st.write("Risk ratings are between 1 and 10, where 1 is low risk and 10 is high risk.")
 
     if st.button("Analyze Risk"):
-        # Fetch and display risk data
-        flood_risk = get_flood_risk(
-            openai_client,
-            gmaps_client,
-            st.session_state["user_profile"]["address"]
-        )
-        # Get flood risk number
-        flood_risk_rating = flood_risk.split("\n")[0].split(":")[1].strip()
-        flood_risk_explanation = flood_risk.split("\n")[1].split(":")[1].strip()
-        st.session_state["user_profile"]["flood_risk"] = {
-            "rating": flood_risk_rating,
-            "explanation": flood_risk_explanation
-        }
-        print(f"Flood Risk: {st.session_state['user_profile']['flood_risk']}")
-
-        earthquake_risk = get_earthquake_risk(
-            openai_client,
-            gmaps_client,
-            st.session_state["user_profile"]["address"]
-        )
-        # Get earthquake risk number
-        earthquake_risk_rating = earthquake_risk.split("\n")[0].split(":")[1].strip()
-        earthquake_risk_explanation = earthquake_risk.split("\n")[1].split(":")[1].strip()
-        st.session_state["user_profile"]["earthquake_risk"] = {
-                "rating": earthquake_risk_rating,
-                "explanation": earthquake_risk_explanation
-        }
-        print(f"Earthquake Risk: {st.session_state['user_profile']['earthquake_risk']}")
+        address = st.session_state["user_profile"].address
+        risk_scheduler.add_household(address, address)
+
+        # Use the precomputed results if the background scheduler has fresh ones
+        risk_results = risk_scheduler.get_results(address)
+        if risk_results is None:
+            # Fetch and display risk data
+            risk_results = {
+                "flood": get_flood_risk(
+                    openai_client,
+                    gmaps_client,
+                    address
+                ),
+                "earthquake": get_earthquake_risk(
+                    openai_client,
+                    gmaps_client,
+                    address
+                ),
+            }
+            risk_scheduler.record_results(
+                address,
+                {hazard: result for hazard, result in risk_results.items() if result is not None}
+            )
+
+        st.session_state["user_profile"].flood_risk = risk_results["flood"]
+        print(f"Flood Risk: {st.session_state['user_profile'].flood_risk}")
+
+        st.session_state["user_profile"].earthquake_risk = risk_results["earthquake"]
+        print(f"Earthquake Risk: {st.session_state['user_profile'].earthquake_risk}")
 
         # fire_risk = get_fire_risk(
         #     openai_client,
         #     gmaps_client,
-        #     st.session_state["user_profile"]["address"]
+        #     st.session_state["user_profile"].address
         # )
         # st.write(f"{fire_risk}")
     
     # Show risk dashboard
-    if st.session_state["user_profile"]["flood_risk"] or st.session_state["user_profile"]["earthquake_risk"]:
+    if st.session_state["user_profile"].flood_risk:
         st.write("### Flood Risk")
-        flood_risk_color = get_color_risk_level(int(st.session_state["user_profile"]["flood_risk"]["rating"]))
+        flood_risk_color = get_color_risk_level(st.session_state["user_profile"].flood_risk.rating)
         colored_flood_risk = colored_text(
-            f"{st.session_state['user_profile']['flood_risk']['rating']}",
+            f"{st.session_state['user_profile'].flood_risk.rating}",
             flood_risk_color
         )
         st.markdown(f"Flood Risk Rating: {colored_flood_risk}", unsafe_allow_html=True)
-        st.write(f"{st.session_state['user_profile']['flood_risk']['explanation']}")
+        st.write(f"{st.session_state['user_profile'].flood_risk.explanation}")
 
+    if st.session_state["user_profile"].earthquake_risk:
         st.write("### Earthquake Risk")
-        earthquake_risk_color = get_color_risk_level(int(st.session_state["user_profile"]["earthquake_risk"]["rating"]))
+        earthquake_risk_color = get_color_risk_level(st.session_state["user_profile"].earthquake_risk.rating)
         colored_earthquake_risk = colored_text(
-            f"{st.session_state['user_profile']['earthquake_risk']['rating']}",
+            f"{st.session_state['user_profile'].earthquake_risk.rating}",
             earthquake_risk_color
         )
         st.markdown(f"Earthquake Risk Rating: {colored_earthquake_risk}", unsafe_allow_html=True)
-        st.write(f"{st.session_state['user_profile']['earthquake_risk']['explanation']}")
+        st.write(f"{st.session_state['user_profile'].earthquake_risk.explanation}")
 
     # Generate Preparation Checklist
     st.subheader("Preparation Checklist")
@@ -165,19 +177,19 @@ def main():
             st.session_state["user_profile"]
         )
 
-        for task, weight in checklist.items():
-            st.session_state["preparedness_checklist"][task] = {
-                "is_done": False,
-                "weight": weight
-            }
+        # New tasks replace existing ones with the same name
+        checklist_tasks = {task.task: task for task in st.session_state["preparedness_checklist"]}
+        for task in checklist or []:
+            checklist_tasks[task.task] = task
+        st.session_state["preparedness_checklist"] = list(checklist_tasks.values())
 
     # Calculate and display preparedness score
 
     # Show preparedness checklist as list of checkboxes
     if st.session_state["preparedness_checklist"]:
         st.write("Preparedness Checklist:")
-        for task, data in st.session_state["preparedness_checklist"].items():
-            data["is_done"] = st.checkbox(task, value=data["is_done"])
+        for task in st.session_state["preparedness_checklist"]:
+            task.is_done = st.checkbox(task.task, value=task.is_done)
             st.session_state["preparedness_score"] = calculate_preparedness_score(
                 st.session_state["preparedness_checklist"]
             )
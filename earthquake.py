@@ -4,8 +4,13 @@ import requests
 from requests.exceptions import HTTPError, Timeout, RequestException
 
 from utils import get_lat_lon
+from llm import request_risk_assessment
+from models import EarthquakeEvent
 
 BASE_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query"
+REQUEST_TIMEOUT = 10  # Seconds to wait for the API before giving up
+
+HARD_MAGNITUDE = 3.5  # Earthquakes at or above this magnitude make the assessment ambiguous
 
 
 def get_earthquake_data(location, radius=100):
@@ -36,7 +41,7 @@ def get_earthquake_data(location, radius=100):
     }
 
     try:
-        response = requests.get(BASE_URL, params=params)
+        response = requests.get(BASE_URL, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return response.json()
 
@@ -60,7 +65,7 @@ def get_earthquake_risk(openai_client, gmaps_client, address):
         address (str): The address for the model to assess for earthquake risk.
         
     Returns:
-        str: A message indicating the earthquake risk level.
+        RiskResult: The assessed earthquake risk, or None if it could not be assessed.
     """
 
     system_prompt = """
@@ -76,58 +81,57 @@ def get_earthquake_risk(openai_client, gmaps_client, address):
 
     lat_lon = get_lat_lon(gmaps_client, address)
     if not lat_lon:
-        return "Could not determine location for the provided address."
+        return None
 
     earthquake_data = get_earthquake_data(lat_lon)
 
     if earthquake_data:
-        recent_earthquake_data = ""
-        if 'features' not in earthquake_data or not earthquake_data['features']:
-            recent_earthquake_data = "No recent earthquakes found in the vicinity."
-
-        if earthquake_data['features']:
-            earthquakes_list = []
-
-            for feature in earthquake_data['features']:
-                earthquake = {}
-                
-                earthquake['magnitude'] = feature['properties'].get('mag', 'N/A')
-                earthquake['place'] = feature['properties'].get('place', 'Unknown location')
-                earthquake['time'] = feature['properties'].get('time', 'Unknown time')
+        earthquakes_list = [
+            EarthquakeEvent.from_feature(feature) for feature in earthquake_data.get('features') or []
+        ]
 
-                earthquakes_list.append(earthquake)
+        # Strongest earthquakes first so they are kept when the data is trimmed to the token budget
+        earthquakes_list.sort(key=_magnitude, reverse=True)
 
-            recent_earthquake_data = "\n".join(
-                f"Magnitude: {eq['magnitude']}, Place: {eq['place']}, Time: {eq['time']}"
-                for eq in earthquakes_list
-            )    
+        recent_earthquakes = [eq.describe() for eq in earthquakes_list]
+        if not recent_earthquakes:
+            recent_earthquakes = ["No recent earthquakes found in the vicinity."]
 
-        # Combine the prompt with the earthquake data
+        # Combine the location with the earthquake data
         location_info = f"Location: {lat_lon[0]}, {lat_lon[1]}"
-        user_prompt = f"{location_info}\n\nRecent Earthquake Data: {recent_earthquake_data}"
+        header = f"{location_info}\n\nRecent Earthquake Data:"
 
         # Call the OpenAI model to get the earthquake risk assessment
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=500,
+        return request_risk_assessment(
+            openai_client,
+            "earthquake",
+            system_prompt,
+            header,
+            recent_earthquakes,
+            is_hard=is_earthquake_assessment_hard(earthquakes_list),
             temperature=0.5,
+            summarize=_summarize_omitted_earthquakes,
         )
 
-        # Extract and format the response
-        if response and response.choices:
-            response_content = response.choices[0].message.content.strip()
 
-            if "Risk Level:" in response_content and "Explanation:" in response_content:
-                risk_level = response_content.split("Risk Level:")[1].split("\n")[0].strip()
-                explanation = response_content.split("Explanation:")[1].strip()
-                return f"Risk Level: {risk_level}\nExplanation: {explanation}"
-            
-            else:
-                return None
+def is_earthquake_assessment_hard(earthquakes):
+    """
+    Returns whether the earthquake data is ambiguous or indicates a high risk.
+    Only weak earthquakes, or none at all, are a clear signal that the small model can assess.
+
+    Args:
+        earthquakes (list): A list of EarthquakeEvent.
+    Returns:
+        bool: True if the assessment should go to the large model.
+    """
+    if not earthquakes:
+        return False
+    return max(_magnitude(eq) for eq in earthquakes) >= HARD_MAGNITUDE
+
+
+def _magnitude(earthquake):
+    return earthquake.magnitude if earthquake.magnitude is not None else 0.0
+
 
-        else:
-            return None
\ No newline at end of file
+def _summarize_omitted_earthquakes(omitted):
+    return f"... and {len(omitted)} weaker earthquakes omitted."
@@ -0,0 +1,468 @@
+# Contains functions for precomputing evacuation routes on a local road network
+#
+# The road network is loaded from a local extract into a compact CSR (compressed sparse row)
+# graph. Shortest paths from every road node to the nearest shelter or safe zone are precomputed
+# with a single multi-source Dijkstra, so answering a household's route is just following
+# next hop pointers. Road nodes inside hazard polygons, and road segments crossing them, are
+# avoided, and cached routes are dropped whenever the hazard polygons change.
+#
+# Input files are CSVs with a header row:
+#     nodes:        id,lat,lon
+#     edges:        source,target[,length_m][,oneway]   (length defaults to the straight line distance)
+#     destinations: name,lat,lon
+
+import csv
+import heapq
+import math
+from array import array
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+CELL_SIZE = 0.01  # Degrees, roughly 1 km; used for both the spatial index and the route cache
+ROUTE_CACHE_PRECISION = 4  # Decimal places of the cached household coordinates, roughly 10 m
+CLEARANCE_MARGIN = 0.99  # Safety factor on the flat-earth ring clearance in nearest_node
+INFINITY = float("inf")
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Returns the great circle distance between two points in meters.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def get_cell(lat, lon, cell_size=CELL_SIZE):
+    """
+    Returns the grid cell that contains a point.
+    Args:
+        lat (float): The latitude of the point.
+        lon (float): The longitude of the point.
+        cell_size (float): The size of a cell in degrees.
+    Returns:
+        tuple: The (row, column) of the cell.
+    """
+    return (math.floor(lat / cell_size), math.floor(lon / cell_size))
+
+
+def point_in_polygon(lat, lon, polygon):
+    """
+    Returns whether a point is inside a polygon, using ray casting.
+    Args:
+        lat (float): The latitude of the point.
+        lon (float): The longitude of the point.
+        polygon (list): The polygon vertices as (latitude, longitude) tuples.
+    Returns:
+        bool: True if the point is inside the polygon.
+    """
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lon_i > lon) != (lon_j > lon):
+            crossing_lat = lat_i + (lon - lon_i) * (lat_j - lat_i) / (lon_j - lon_i)
+            if lat < crossing_lat:
+                inside = not inside
+        j = i
+    return inside
+
+
+def segments_intersect(a, b, c, d):
+    """
+    Returns whether the segments a-b and c-d intersect, treating (latitude, longitude) as planar.
+    """
+    def orientation(p, q, r):
+        value = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+        return (value > 0) - (value < 0)
+
+    def on_segment(p, q, r):
+        return min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and min(p[1], r[1]) <= q[1] <= max(p[1], r[1])
+
+    o1, o2 = orientation(a, b, c), orientation(a, b, d)
+    o3, o4 = orientation(c, d, a), orientation(c, d, b)
+    if o1 != o2 and o3 != o4:
+        return True
+
+    # Collinear cases
+    return (
+        (o1 == 0 and on_segment(a, c, b)) or (o2 == 0 and on_segment(a, d, b))
+        or (o3 == 0 and on_segment(c, a, d)) or (o4 == 0 and on_segment(c, b, d))
+    )
+
+
+def segment_crosses_polygon(a, b, polygon):
+    """
+    Returns whether the segment a-b crosses any side of a polygon.
+    """
+    return any(
+        segments_intersect(a, b, polygon[i - 1], polygon[i])
+        for i in range(len(polygon))
+    )
+
+
+class RoadGraph:
+    """
+    Compact array backed road graph in CSR form.
+
+    Edges are stored in reverse (incoming edges per node), which is what the multi-source
+    search from the destinations walks. Node coordinates are kept in parallel arrays.
+
+    Args:
+        node_ids (list): The original id of each node.
+        lats (array): The latitude of each node.
+        lons (array): The longitude of each node.
+        offsets (array): For node i, its incoming edges are in [offsets[i], offsets[i + 1]).
+        sources (array): The source node of each incoming edge.
+        lengths (array): The length of each incoming edge in meters.
+    """
+
+    def __init__(self, node_ids, lats, lons, offsets, sources, lengths):
+        self.node_ids = node_ids
+        self.lats = lats
+        self.lons = lons
+        self.offsets = offsets
+        self.sources = sources
+        self.lengths = lengths
+        self.node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+        # Spatial index of node indexes by grid cell, used to snap points to the road network
+        self.cells = {}
+        for i in range(len(node_ids)):
+            self.cells.setdefault(get_cell(lats[i], lons[i]), array("l")).append(i)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.sources)
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """
+        Builds a graph from lists of nodes and edges.
+        Args:
+            nodes (list): (id, lat, lon) tuples.
+            edges (list): (source_id, target_id, length_m, oneway) tuples. A length of None
+                uses the straight line distance between the nodes.
+        Returns:
+            RoadGraph: The graph.
+        """
+        node_ids = [node_id for node_id, _, _ in nodes]
+        lats = array("d", (lat for _, lat, _ in nodes))
+        lons = array("d", (lon for _, _, lon in nodes))
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+        # Collect incoming edges as (target, source, length), then counting sort by target
+        incoming = []
+        for source_id, target_id, length, oneway in edges:
+            source, target = index[source_id], index[target_id]
+            if length is None:
+                length = haversine(lats[source], lons[source], lats[target], lons[target])
+            incoming.append((target, source, length))
+            if not oneway:
+                incoming.append((source, target, length))
+
+        offsets = array("l", [0] * (len(node_ids) + 1))
+        for target, _, _ in incoming:
+            offsets[target + 1] += 1
+        for i in range(len(node_ids)):
+            offsets[i + 1] += offsets[i]
+
+        sources = array("l", [0] * len(incoming))
+        lengths = array("d", [0.0] * len(incoming))
+        position = array("l", offsets[:-1])
+        for target, source, length in incoming:
+            sources[position[target]] = source
+            lengths[position[target]] = length
+            position[target] += 1
+
+        return cls(node_ids, lats, lons, offsets, sources, lengths)
+
+    def nearest_node(self, lat, lon, blocked=None, max_rings=3):
+        """
+        Returns the index of the nearest node to a point, searching rings of cells around the
+        point's cell. Once a node is found, the search continues until no unsearched cell can
+        hold a closer node.
+        Args:
+            lat (float): The latitude of the point.
+            lon (float): The longitude of the point.
+            blocked (bytearray): Optional flags of nodes that must not be returned.
+            max_rings (int): How many rings of neighbouring cells to search for a first node.
+        Returns:
+            int: The node index, or None if no node is found within max_rings rings.
+        """
+        row, col = get_cell(lat, lon)
+        best, best_distance = None, INFINITY
+
+        ring = 0
+        while True:
+            for d_row in range(-ring, ring + 1):
+                for d_col in range(-ring, ring + 1):
+                    if max(abs(d_row), abs(d_col)) != ring:
+                        continue
+                    for i in self.cells.get((row + d_row, col + d_col), ()):
+                        if blocked is not None and blocked[i]:
+                            continue
+                        distance = haversine(lat, lon, self.lats[i], self.lons[i])
+                        if distance < best_distance:
+                            best, best_distance = i, distance
+
+            if best is not None:
+                if _ring_clearance(lat, lon, row, col, ring, best_distance) >= best_distance:
+                    break
+            elif ring >= max_rings:
+                break
+            ring += 1
+
+        return best
+
+
+def _ring_clearance(lat, lon, row, col, ring, best_distance):
+    # Lower bound, in meters, on the distance from the point to any cell outside the searched
+    # rings. Longitude degrees shrink with cos(lat), so use the highest latitude a node closer
+    # than best_distance could have.
+    lat_gap = min(lat - (row - ring) * CELL_SIZE, (row + ring + 1) * CELL_SIZE - lat) * METERS_PER_DEGREE
+    max_abs_lat = min(90.0, abs(lat) + best_distance / METERS_PER_DEGREE)
+    lon_gap = (
+        min(lon - (col - ring) * CELL_SIZE, (col + ring + 1) * CELL_SIZE - lon)
+        * METERS_PER_DEGREE * math.cos(math.radians(max_abs_lat))
+    )
+    return min(lat_gap, lon_gap) * CLEARANCE_MARGIN
+
+
+def load_road_graph(nodes_path, edges_path):
+    """
+    Loads a road network extract from CSV files into a RoadGraph.
+    Args:
+        nodes_path (str): Path to the nodes CSV with id, lat and lon columns.
+        edges_path (str): Path to the edges CSV with source, target and optional length_m and oneway columns.
+    Returns:
+        RoadGraph: The loaded graph.
+    """
+    with open(nodes_path, newline="") as f:
+        nodes = [(row["id"], float(row["lat"]), float(row["lon"])) for row in csv.DictReader(f)]
+
+    with open(edges_path, newline="") as f:
+        edges = [
+            (
+                row["source"],
+                row["target"],
+                float(row["length_m"]) if row.get("length_m") else None,
+                (row.get("oneway") or "").strip().lower() in ("1", "true", "yes"),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+    return RoadGraph.from_edges(nodes, edges)
+
+
+def load_destinations(path):
+    """
+    Loads shelters and safe zones from a CSV file with name, lat and lon columns.
+    Returns:
+        list: (name, lat, lon) tuples.
+    """
+    with open(path, newline="") as f:
+        return [(row["name"], float(row["lat"]), float(row["lon"])) for row in csv.DictReader(f)]
+
+
+class EvacuationRouter:
+    """
+    Answers "nearest safe destination and route" queries for households on a road graph.
+    Road nodes inside hazard polygons and road segments crossing a polygon's sides are never used.
+    Crossing tests treat latitude and longitude as planar, which is accurate at road segment scale.
+
+    Args:
+        graph (RoadGraph): The road graph.
+        destinations (list): Shelters and safe zones as (name, lat, lon) tuples.
+    """
+
+    def __init__(self, graph, destinations):
+        self.graph = graph
+        self.destinations = destinations
+        self.hazard_polygons = []
+
+        self._hazard_fingerprint = None
+        self._blocked = bytearray(graph.num_nodes)
+        self._blocked_edges = bytearray(graph.num_edges)
+        self._distance = None
+        self._next_hop = None
+        self._destination = None
+        self._cache = {}
+
+        self.precompute()
+
+    @property
+    def flagged_cells(self):
+        """
+        Returns the grid cells that contain at least one road node inside a hazard polygon.
+        """
+        return {
+            get_cell(self.graph.lats[i], self.graph.lons[i])
+            for i in range(self.graph.num_nodes)
+            if self._blocked[i]
+        }
+
+    def set_hazard_polygons(self, polygons):
+        """
+        Updates the hazard polygons to avoid. If they changed, the routes are recomputed
+        and all cached routes are invalidated.
+        Args:
+            polygons (list): Polygons as lists of (latitude, longitude) tuples.
+        Returns:
+            bool: True if the polygons changed and the routes were recomputed.
+        """
+        fingerprint = hash(tuple(tuple(map(tuple, polygon)) for polygon in polygons))
+        if fingerprint == self._hazard_fingerprint:
+            return False
+
+        self.hazard_polygons = [list(polygon) for polygon in polygons]
+        self._hazard_fingerprint = fingerprint
+        self._blocked = self._find_blocked_nodes()
+        self._blocked_edges = self._find_blocked_edges()
+        self.precompute()
+        return True
+
+    def _find_blocked_nodes(self):
+        graph = self.graph
+        blocked = bytearray(graph.num_nodes)
+
+        for polygon in self.hazard_polygons:
+            min_lat = min(lat for lat, _ in polygon)
+            max_lat = max(lat for lat, _ in polygon)
+            min_lon = min(lon for _, lon in polygon)
+            max_lon = max(lon for _, lon in polygon)
+
+            # Only test nodes in the cells overlapping the polygon's bounding box
+            min_row, min_col = get_cell(min_lat, min_lon)
+            max_row, max_col = get_cell(max_lat, max_lon)
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    for i in graph.cells.get((row, col), ()):
+                        if not blocked[i] and point_in_polygon(graph.lats[i], graph.lons[i], polygon):
+                            blocked[i] = 1
+
+        return blocked
+
+    def _find_blocked_edges(self):
+        graph = self.graph
+        blocked_edges = bytearray(graph.num_edges)
+        if not self.hazard_polygons:
+            return blocked_edges
+
+        bounds = [
+            (
+                min(lat for lat, _ in polygon), max(lat for lat, _ in polygon),
+                min(lon for _, lon in polygon), max(lon for _, lon in polygon),
+            )
+            for polygon in self.hazard_polygons
+        ]
+        lats, lons = graph.lats, graph.lons
+
+        for target in range(graph.num_nodes):
+            b = (lats[target], lons[target])
+            for e in range(graph.offsets[target], graph.offsets[target + 1]):
+                source = graph.sources[e]
+                a = (lats[source], lons[source])
+                for polygon, (min_lat, max_lat, min_lon, max_lon) in zip(self.hazard_polygons, bounds):
+                    # Cheap bounding box rejection before the exact crossing test
+                    if max(a[0], b[0]) < min_lat or min(a[0], b[0]) > max_lat:
+                        continue
+                    if max(a[1], b[1]) < min_lon or min(a[1], b[1]) > max_lon:
+                        continue
+                    if segment_crosses_polygon(a, b, polygon):
+                        blocked_edges[e] = 1
+                        break
+
+        return blocked_edges
+
+    def precompute(self):
+        """
+        Runs a multi-source Dijkstra from all reachable destinations over the reversed graph,
+        storing for every node its distance to, next hop towards and index of the nearest destination.
+        """
+        graph = self.graph
+        blocked = self._blocked
+        blocked_edges = self._blocked_edges
+        distance = array("d", [INFINITY]) * graph.num_nodes
+        next_hop = array("l", [-1]) * graph.num_nodes
+        destination = array("l", [-1]) * graph.num_nodes
+
+        heap = []
+        for d, (_, lat, lon) in enumerate(self.destinations):
+            node = graph.nearest_node(lat, lon, blocked)
+            if node is not None and distance[node] > 0.0:
+                distance[node] = 0.0
+                destination[node] = d
+                heap.append((0.0, node))
+        heapq.heapify(heap)
+
+        offsets, sources, lengths = graph.offsets, graph.sources, graph.lengths
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if dist > distance[node]:
+                continue
+            for e in range(offsets[node], offsets[node + 1]):
+                source = sources[e]
+                if blocked[source] or blocked_edges[e]:
+                    continue
+                candidate = dist + lengths[e]
+                if candidate < distance[source]:
+                    distance[source] = candidate
+                    next_hop[source] = node
+                    destination[source] = destination[node]
+                    heapq.heappush(heap, (candidate, source))
+
+        self._distance = distance
+        self._next_hop = next_hop
+        self._destination = destination
+        self._cache = {}
+
+    def get_route(self, lat, lon):
+        """
+        Returns the nearest safe destination and the route to it for a household. Routes are
+        cached per grid cell by the household's coordinates rounded to ROUTE_CACHE_PRECISION
+        decimal places, so households a few meters apart share a route.
+        Args:
+            lat (float): The latitude of the household.
+            lon (float): The longitude of the household.
+        Returns:
+            dict: A dictionary with 'destination', 'distance_m' and 'path' (a list of
+                (latitude, longitude) tuples) fields, or None if no destination is reachable.
+        """
+        point = (round(lat, ROUTE_CACHE_PRECISION), round(lon, ROUTE_CACHE_PRECISION))
+        cell_routes = self._cache.setdefault(get_cell(*point), {})
+
+        if point in cell_routes:
+            route = cell_routes[point]
+        else:
+            route = self._build_route(*point)
+            cell_routes[point] = route
+
+        # Copy so callers cannot modify the cached route
+        return None if route is None else {**route, "path": list(route["path"])}
+
+    def _build_route(self, lat, lon):
+        node = self.graph.nearest_node(lat, lon, self._blocked)
+        if node is None:
+            return None
+
+        route = None
+        if self._destination[node] >= 0:
+            path = [node]
+            while self._next_hop[path[-1]] >= 0:
+                path.append(self._next_hop[path[-1]])
+
+            route = {
+                "destination": self.destinations[self._destination[node]][0],
+                "distance_m": round(self._distance[node], 1),
+                "path": [(self.graph.lats[i], self.graph.lons[i]) for i in path],
+            }
+
+        return route
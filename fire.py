@@ -7,9 +7,15 @@ import csv
 from io import StringIO
 
 from utils import get_lat_lon
+from llm import request_risk_assessment
+from models import FireEvent
 
 
 BASE_URL = "https://firms.modaps.eosdis.nasa.gov/api/area/csv/"
+REQUEST_TIMEOUT = 10  # Seconds to wait for the API before giving up
+
+HARD_CONFIDENCE = 50  # Detections at or above this confidence make the assessment ambiguous
+VIIRS_CONFIDENCE = {"l": 20.0, "n": 60.0, "h": 90.0}
 
 def get_fire_data(api_key, location, radius=100, satellite="modis", days=7):
     """
@@ -27,7 +33,7 @@ def get_fire_data(api_key, location, radius=100, satellite="modis", days=7):
     url = f"{BASE_URL} {api_key}/{satellite}/{location[0]},{location[1]},{radius}/{days}"
 
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return response.text  # Return the response text directly as it is in CSV format
 
@@ -41,7 +47,7 @@ def get_fire_data(api_key, location, radius=100, satellite="modis", days=7):
     return None  # Return None if an error occurred
 
 
-def get_fire_risk(openai_client, gmaps_client, address):
+def get_fire_risk(openai_client, gmaps_client, address, api_key=None):
     """
     Returns the fire risk for a given address.
     
@@ -49,9 +55,10 @@ def get_fire_risk(openai_client, gmaps_client, address):
         openai_client (OpenAI): The OpenAI client instance.
         gmaps_client (googlemaps.Client): The Google Maps client instance.
         address (str): The address for the model to assess for fire risk.
+        api_key (str): The FIRMS API key. Defaults to the one in the streamlit secrets.
         
     Returns:
-        str: A message indicating the fire risk level.
+        RiskResult: The assessed fire risk, or None if it could not be assessed.
     """
 
     prompt = """
@@ -66,65 +73,67 @@ def get_fire_risk(openai_client, gmaps_client, address):
     lat_lon = get_lat_lon(gmaps_client, address)
     
     if not lat_lon:
-        return "Could not determine location for the provided address."
+        return None
 
-    api_key = st.secrets["FIRMS_MAP_KEY"]
+    if api_key is None:
+        api_key = st.secrets["FIRMS_MAP_KEY"]
     fire_data = get_fire_data(api_key, lat_lon)
 
-    recent_fire_data = ""
     if fire_data:
         reader = csv.DictReader(StringIO(fire_data))
         fires = list(reader)
 
         print(f"Fetched fire data: {fires}")  # Debugging line to check fetched data
 
-        fires_list = []
-        if fires:
-            for sample in fires:
-                fire = {
-                    'latitude': sample['latitude'],
-                    'longitude': sample['longitude'],
-                    'brightness': sample['brightness'],
-                    'scan_time': sample['scan_time'],
-                    'acq_date': sample['acq_date'],
-                    'acq_time': sample['acq_time'],
-                    'confidence': sample['confidence']
-                }
-
-                fires_list.append(fire)
-
-        recent_fire_data = "\n".join(
-            f"Latitude: {fire['latitude']}, Longitude: {fire['longitude']}, "
-            f"Brightness: {fire['brightness']} K, Scan Time: {fire['scan_time']}, "
-            f"Acquisition Date: {fire['acq_date']}, Acquisition Time: {fire['acq_time']}, "
-            f"Confidence: {fire['confidence']}%"
-            for fire in fires_list
-        )
+        fires_list = [FireEvent.from_csv_row(sample) for sample in fires]
 
-        # Combine the prompt with the fire data
-        location_info = f"Location: {lat_lon[0]}, {lat_lon[1]}"
-        full_prompt = f"{prompt}\n\n{location_info}\n\nRecent Fire Data: {recent_fire_data}"
+        # Most confident and brightest detections first so they are kept when trimming to the token budget
+        fires_list.sort(key=lambda fire: (_confidence(fire), fire.brightness), reverse=True)
+
+        recent_fires = [fire.describe() for fire in fires_list]
+        if not recent_fires:
+            recent_fires = ["No active fires detected in the vicinity."]
 
-        # Call the OpenAI model to get the earthquake risk assessment
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": full_prompt}],
-            max_tokens=500,
+        # Combine the location with the fire data
+        location_info = f"Location: {lat_lon[0]}, {lat_lon[1]}"
+        header = f"{location_info}\n\nRecent Fire Data:"
+
+        # Call the OpenAI model to get the fire risk assessment
+        return request_risk_assessment(
+            openai_client,
+            "fire",
+            prompt,
+            header,
+            recent_fires,
+            is_hard=is_fire_assessment_hard(fires_list),
             temperature=0.7,
+            summarize=_summarize_omitted_fires,
         )
 
-        # Extract and format the response
-        if response and response.choices:
-            response_content = response.choices[0].message.content.strip()
-
-            if "Risk Level:" in response_content and "Explanation:" in response_content:
-                risk_level = response_content.split("Risk Level:")[1].split("\n")[0].strip()
-                explanation = response_content.split("Explanation:")[1].strip()
-                return f"Risk Level: {risk_level}\nExplanation: {explanation}"
-            
-            else:
-                return None
-
-        else:
-            return None
-        
\ No newline at end of file
+
+def is_fire_assessment_hard(fires):
+    """
+    Returns whether the fire data is ambiguous or indicates a high risk.
+    Only low confidence detections, or none at all, are a clear signal that the small model can assess.
+
+    Args:
+        fires (list): A list of FireEvent.
+    Returns:
+        bool: True if the assessment should go to the large model.
+    """
+    return any(_confidence(fire) >= HARD_CONFIDENCE for fire in fires)
+
+
+def _confidence(fire):
+    # MODIS reports confidence as a percentage, VIIRS as low/nominal/high
+    confidence = fire.confidence.strip().lower()
+    if confidence in VIIRS_CONFIDENCE:
+        return VIIRS_CONFIDENCE[confidence]
+    try:
+        return float(confidence)
+    except ValueError:
+        return 0.0
+
+
+def _summarize_omitted_fires(omitted):
+    return f"... and {len(omitted)} lower confidence fire detections omitted."
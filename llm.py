@@ -0,0 +1,155 @@
+# Contains helpers for budgeting prompt tokens and routing requests to OpenAI models
+
+from models import RiskResult
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character based estimate
+    tiktoken = None
+
+SMALL_MODEL = "gpt-3.5-turbo"
+LARGE_MODEL = "gpt-4"
+
+# Maximum number of tokens (system + user prompt) sent to each model per call
+PROMPT_TOKEN_BUDGET = {
+    SMALL_MODEL: 1500,
+    LARGE_MODEL: 3000,
+}
+
+# Risk levels from the small model at or above this are re-assessed by the large model
+ESCALATION_RISK_LEVEL = 7
+
+CHARS_PER_TOKEN = 4  # Rough average for English text, used when tiktoken is not installed
+SUMMARY_RESERVE = 30  # Tokens kept free for the line summarizing omitted items
+
+# Share of each budget left unused when tokens are estimated. Numbers and coordinates take
+# fewer characters per token than English text, so the estimate can fall well short.
+ESTIMATE_MARGIN = 0.25
+
+
+def count_tokens(text, model=SMALL_MODEL):
+    """
+    Counts the number of tokens in a text for a given model. tiktoken is an optional
+    dependency; without it the count is only an estimate from the text length.
+
+    Args:
+        text (str): The text to measure.
+        model (str): The model whose tokenizer should be used.
+    Returns:
+        int: The number of tokens, estimated from the text length if tiktoken is not installed.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text))
+
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def fit_to_budget(header, items, budget, model=SMALL_MODEL, summarize=None):
+    """
+    Builds a prompt from a header and as many item lines as fit in the token budget.
+
+    Args:
+        header (str): Text that is always included at the start of the prompt.
+        items (list): Lines of input data, ordered from most to least important.
+        budget (int): Maximum number of tokens for the whole prompt.
+        model (str): The model whose tokenizer should be used.
+        summarize (callable): Optional function that receives the omitted items and returns a
+            one line summary of them. Defaults to a count of the omitted items.
+    Returns:
+        str: The prompt, with omitted items replaced by a summary line.
+    """
+    lines = [header]
+    used = count_tokens(header, model)
+
+    included = 0
+    for item in items:
+        cost = count_tokens(item, model) + 1  # +1 for the newline
+        if used + cost > budget - SUMMARY_RESERVE:
+            break
+        lines.append(item)
+        used += cost
+        included += 1
+
+    omitted = items[included:]
+    if omitted:
+        if summarize is not None:
+            lines.append(summarize(omitted))
+        else:
+            lines.append(f"... and {len(omitted)} more entries omitted.")
+
+    return "\n".join(lines)
+
+
+def route_model(is_hard):
+    """
+    Returns the model to use for a request.
+
+    Args:
+        is_hard (bool): Whether the inputs are ambiguous or indicate a high risk.
+    Returns:
+        str: The large model for hard cases, the small model otherwise.
+    """
+    return LARGE_MODEL if is_hard else SMALL_MODEL
+
+
+def prompt_budget(system_prompt, model):
+    """
+    Returns the number of tokens left for the user prompt after the system prompt.
+    When tiktoken is not installed, ESTIMATE_MARGIN of the budget is kept free to make up
+    for the estimated counts.
+    """
+    budget = PROMPT_TOKEN_BUDGET[model]
+    if tiktoken is None:
+        budget = int(budget * (1 - ESTIMATE_MARGIN))
+    return budget - count_tokens(system_prompt, model)
+
+
+def request_risk_assessment(openai_client, hazard, system_prompt, header, items, is_hard, temperature=0.7, summarize=None):
+    """
+    Requests a risk assessment, routing it to a model based on its difficulty and trimming
+    the input data to that model's token budget. Easy cases rated as high risk, or answered
+    in an unexpected format, by the small model are escalated to the large model.
+
+    Args:
+        openai_client (OpenAI): The OpenAI client instance.
+        hazard (str): The assessed hazard, e.g. "flood".
+        system_prompt (str): The system prompt describing the assessment.
+        header (str): Text always included in the user prompt, e.g. the location.
+        items (list): Lines of hazard data, ordered from most to least important.
+        is_hard (bool): Whether the hazard data is ambiguous or indicates a high risk.
+        temperature (float): The sampling temperature.
+        summarize (callable): Optional function that summarizes omitted items in one line.
+    Returns:
+        RiskResult: The risk assessment, or None if the model did not return one.
+    """
+    model = route_model(is_hard)
+
+    while True:
+        user_prompt = fit_to_budget(header, items, prompt_budget(system_prompt, model), model, summarize)
+
+        response = openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=500,
+            temperature=temperature,
+        )
+
+        risk_result = None
+        if response and response.choices:
+            risk_result = RiskResult.from_response_text(hazard, response.choices[0].message.content.strip())
+
+        if model == LARGE_MODEL or not _needs_escalation(risk_result):
+            return risk_result
+
+        model = LARGE_MODEL
+
+
+def _needs_escalation(risk_result):
+    return risk_result is None or risk_result.rating >= ESCALATION_RISK_LEVEL
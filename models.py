@@ -0,0 +1,282 @@
+# Contains the data model shared across the application
+#
+# Records are slotted dataclasses, so they take far less memory than the equivalent dicts when
+# many households are held at once. They serialize to plain dicts for JSON APIs, and to compact
+# rows (field values in declaration order) for bulk storage with dumps() and loads().
+
+import json
+import re
+from dataclasses import dataclass, field, fields
+
+RATING_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+PLAIN_TYPES = (str, int, float, bool)
+
+
+class Record:
+    """
+    Base class for records, providing dict and row conversion for flat records.
+    Records with nested records override the from_* classmethods.
+
+    from_dict() raises TypeError when the data is not a dict or a str, int, float or bool
+    field has a value of another type. int fields also accept integral floats (e.g. 5.0) and
+    float fields accept ints, but numeric fields never accept bools.
+    """
+
+    __slots__ = ()
+
+    def to_dict(self):
+        return {f.name: _to_plain(getattr(self, f.name)) for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, data):
+        _check_dict(cls, data)
+        values = {}
+        for f in fields(cls):
+            if f.name not in data:
+                continue
+            value = data[f.name]
+            if f.type in PLAIN_TYPES:
+                value = _to_plain_type(f.type, value, f"{cls.__name__}.{f.name}")
+            values[f.name] = value
+        return cls(**values)
+
+    def to_row(self):
+        return [_to_row(getattr(self, f.name)) for f in fields(self)]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+@dataclass(slots=True)
+class FamilyMember(Record):
+    name: str = ""
+    contact_number: str = ""
+    email: str = ""
+    age: int | None = None
+    mobility_needs: str = "None"
+    medication: str = "None"
+
+    def __post_init__(self):
+        self.age = _to_int(self.age)
+
+
+@dataclass(slots=True)
+class RiskResult(Record):
+    hazard: str
+    rating: int
+    explanation: str
+
+    @classmethod
+    def from_response_text(cls, hazard, text):
+        """
+        Parses a model response in the format "Risk Level: <number>\\nExplanation: <text>".
+        Args:
+            hazard (str): The assessed hazard, e.g. "flood".
+            text (str): The model response.
+        Returns:
+            RiskResult: The parsed result, or None if the response is malformed.
+        """
+        if not text or "Risk Level:" not in text or "Explanation:" not in text:
+            return None
+
+        rating = RATING_PATTERN.search(text.split("Risk Level:")[1].split("\n")[0])
+        if rating is None:
+            return None
+
+        explanation = text.split("Explanation:")[1].strip()
+        return cls(hazard, round(float(rating.group())), explanation)
+
+
+@dataclass(slots=True)
+class UserProfile(Record):
+    household_name: str = ""
+    address: str = ""
+    family_members: list = field(default_factory=list)
+    flood_risk: RiskResult | None = None
+    earthquake_risk: RiskResult | None = None
+    fire_risk: RiskResult | None = None
+
+    @property
+    def risks(self):
+        return [risk for risk in (self.flood_risk, self.earthquake_risk, self.fire_risk) if risk is not None]
+
+    @classmethod
+    def from_dict(cls, data):
+        _check_dict(cls, data)
+        for name in ("household_name", "address"):
+            if not isinstance(data.get(name, ""), str):
+                raise TypeError(f"UserProfile.{name} must be of type str.")
+        family_members = data.get("family_members", [])
+        if not isinstance(family_members, list):
+            raise TypeError("UserProfile.family_members must be a list.")
+
+        return cls(
+            household_name=data.get("household_name", ""),
+            address=data.get("address", ""),
+            family_members=[FamilyMember.from_dict(member) for member in family_members],
+            flood_risk=_risk_from_dict("flood", data.get("flood_risk")),
+            earthquake_risk=_risk_from_dict("earthquake", data.get("earthquake_risk")),
+            fire_risk=_risk_from_dict("fire", data.get("fire_risk")),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        household_name, address, members, flood_risk, earthquake_risk, fire_risk = row
+        return cls(
+            household_name,
+            address,
+            [FamilyMember.from_row(member) for member in members],
+            _risk_from_row(flood_risk),
+            _risk_from_row(earthquake_risk),
+            _risk_from_row(fire_risk),
+        )
+
+
+@dataclass(slots=True)
+class EarthquakeEvent(Record):
+    magnitude: float | None
+    place: str
+    time: int | None
+
+    @classmethod
+    def from_feature(cls, feature):
+        """
+        Creates an event from a USGS GeoJSON feature.
+        """
+        properties = feature.get("properties", {})
+        return cls(properties.get("mag"), properties.get("place") or "Unknown location", properties.get("time"))
+
+    def describe(self):
+        magnitude = "N/A" if self.magnitude is None else self.magnitude
+        time = "Unknown time" if self.time is None else self.time
+        return f"Magnitude: {magnitude}, Place: {self.place}, Time: {time}"
+
+
+@dataclass(slots=True)
+class FireEvent(Record):
+    latitude: float
+    longitude: float
+    brightness: float
+    scan_time: str
+    acq_date: str
+    acq_time: str
+    confidence: str
+
+    @classmethod
+    def from_csv_row(cls, row):
+        """
+        Creates an event from a row of the FIRMS CSV response.
+        """
+        return cls(
+            float(row["latitude"]),
+            float(row["longitude"]),
+            _to_float(row["brightness"]),
+            row["scan_time"],
+            row["acq_date"],
+            row["acq_time"],
+            row["confidence"],
+        )
+
+    def describe(self):
+        return (
+            f"Latitude: {self.latitude}, Longitude: {self.longitude}, "
+            f"Brightness: {self.brightness} K, Scan Time: {self.scan_time}, "
+            f"Acquisition Date: {self.acq_date}, Acquisition Time: {self.acq_time}, "
+            f"Confidence: {self.confidence}%"
+        )
+
+
+@dataclass(slots=True)
+class ChecklistTask(Record):
+    task: str
+    weight: int
+    is_done: bool = False
+
+
+def dumps(records):
+    """
+    Serializes a list of records of the same type to compact JSON rows.
+    Args:
+        records (list): The records to serialize.
+    Returns:
+        str: A JSON array with one array of field values per record.
+    """
+    return json.dumps([record.to_row() for record in records], separators=(",", ":"))
+
+
+def loads(record_type, data):
+    """
+    Deserializes records serialized with dumps().
+    Args:
+        record_type (type): The record class, e.g. UserProfile.
+        data (str): The JSON produced by dumps().
+    Returns:
+        list: The records.
+    """
+    return [record_type.from_row(row) for row in json.loads(data)]
+
+
+def _to_plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    return value
+
+
+def _to_row(value):
+    if isinstance(value, Record):
+        return value.to_row()
+    if isinstance(value, list):
+        return [_to_row(item) for item in value]
+    return value
+
+
+def _check_dict(cls, data):
+    if not isinstance(data, dict):
+        raise TypeError(f"{cls.__name__} must be created from a dict, got {type(data).__name__}.")
+
+
+def _risk_from_dict(hazard, data):
+    # Empty dicts and None stand for "not assessed yet"
+    if not data:
+        return None
+    _check_dict(RiskResult, data)
+
+    rating = _to_plain_type(int, data.get("rating"), f"The {hazard} risk rating")
+    return RiskResult(data.get("hazard", hazard), rating, str(data.get("explanation", "")))
+
+
+def _to_plain_type(field_type, value, name):
+    # Numbers are checked by value rather than by JSON type, since JSON does not tell 5 from 5.0
+    if field_type in (int, float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"{name} must be a number, got {type(value).__name__}.")
+        if field_type is int:
+            if not float(value).is_integer():
+                raise TypeError(f"{name} must be an integer, got {value!r}.")
+            return int(value)
+        return float(value)
+
+    if not isinstance(value, field_type):
+        raise TypeError(f"{name} must be of type {field_type.__name__}, got {type(value).__name__}.")
+    return value
+
+
+def _risk_from_row(row):
+    return RiskResult.from_row(row) if row else None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
@@ -1,21 +1,28 @@
 # Contains scripts for generating preparedness information
 
+from llm import fit_to_budget, prompt_budget, route_model
+from models import ChecklistTask
+
+HARD_RISK_LEVEL = 7  # Risk levels at or above this need the large model for the checklist
+ELDERLY_AGE = 65
+YOUNG_CHILD_AGE = 5
+
 def calculate_preparedness_score(tasks):
     """
     Calculate a preparedness score based on the tasks completed.
 
     Args:
-        tasks (dict): A dict of tasks, each task being a dictionary with 'is_done' and 'weight' fields.
+        tasks (list): A list of ChecklistTask.
     Returns:
-        int: The total preparedness score.
+        float: The total preparedness score.
     """
     total_weight = 0
     scored_weight = 0
 
-    for task, data in tasks.items():
-        total_weight += data["weight"]
-        if data["is_done"]:
-            scored_weight += data["weight"]
+    for task in tasks:
+        total_weight += task.weight
+        if task.is_done:
+            scored_weight += task.weight
 
     if total_weight == 0:
         return 0.0
@@ -30,10 +37,10 @@ def generate_preparation_checklist(openai_client, user_profile):
     Given risk data and user profile, generate a personalized preparation checklist.
 
     Args:
-        risk_data (dict): A dictionary containing risk data relevant to the user.
-        user_profile (dict): A dictionary containing user profile information.
+        openai_client (OpenAI): The OpenAI client instance.
+        user_profile (UserProfile): The user profile, including its assessed risks.
     Returns:
-        list: A list of preparation tasks tailored to the user's risk profile.
+        list: A list of ChecklistTask tailored to the user's risk profile.
     """
 
     system_prompt = """
@@ -52,12 +59,13 @@ def generate_preparation_checklist(openai_client, user_profile):
         ]
     """
 
-    user_prompt = f"""
-        User Profile: {user_profile}
-    """
+    # Route by difficulty and trim the profile to the chosen model's token budget
+    model = route_model(is_checklist_hard(user_profile))
+    header, members = _format_user_profile(user_profile)
+    user_prompt = fit_to_budget(header, members, prompt_budget(system_prompt, model), model)
 
     response = openai_client.chat.completions.create(
-        model="gpt-4",
+        model=model,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
@@ -81,7 +89,7 @@ def generate_preparation_checklist(openai_client, user_profile):
 
             # Separate tasks and weights
             tasks = [task.strip() for task in tasks if task.strip()]
-            tasks_dict = {}
+            checklist = []
             for task in tasks:
                 task_name, weight = task.split(':')
                 # Remove any non-number from weight if present
@@ -92,11 +100,56 @@ def generate_preparation_checklist(openai_client, user_profile):
 
                 # Remove - Weight from task name if present
                 task_name = task_name.replace('- Weight', '').strip()
-                tasks_dict[task_name.strip()] = int(weight.strip())
-            return tasks_dict
+                checklist.append(ChecklistTask(task_name.strip(), int(weight.strip())))
+            return checklist
         else:
             return None
 
     else:
         return None
 
+
+def is_checklist_hard(user_profile):
+    """
+    Returns whether a checklist needs the large model. Households with vulnerable members
+    (elderly, young children, mobility needs or medication) or a high assessed risk are hard.
+
+    Args:
+        user_profile (UserProfile): The user profile, including its assessed risks.
+    Returns:
+        bool: True if the checklist should be generated by the large model.
+    """
+    for risk in user_profile.risks:
+        if risk.rating >= HARD_RISK_LEVEL:
+            return True
+
+    return any(_is_vulnerable(member) for member in user_profile.family_members)
+
+
+def _is_vulnerable(member):
+    if member.age is not None and (member.age >= ELDERLY_AGE or member.age <= YOUNG_CHILD_AGE):
+        return True
+
+    return any(
+        (need or "").strip().lower() not in ("", "none", "n/a")
+        for need in (member.mobility_needs, member.medication)
+    )
+
+
+def _format_user_profile(user_profile):
+    # Contact details do not affect the checklist, so only the relevant fields are sent
+    header_lines = [f"Address: {user_profile.address}"]
+    for risk in user_profile.risks:
+        header_lines.append(
+            f"{risk.hazard.capitalize()} Risk Level: {risk.rating}, Explanation: {risk.explanation}"
+        )
+    header_lines.append("Family Members:")
+
+    # Vulnerable members first so they are kept when trimming to the token budget
+    members = sorted(user_profile.family_members, key=_is_vulnerable, reverse=True)
+    member_lines = [
+        f"Name: {member.name}, Age: {member.age}, "
+        f"Mobility Needs: {member.mobility_needs}, Medication: {member.medication}"
+        for member in members
+    ]
+    return "\n".join(header_lines), member_lines
@@ -0,0 +1,528 @@
+# Contains the background scheduler that keeps the risk assessments of saved households fresh
+#
+# Households are refreshed in priority order: the staler a household's results, the higher its
+# priority. A change in the hazard inputs near the household (latest earthquake, latest fire
+# detection or forecast update) and active weather alerts raise it further; a change re-runs only
+# the hazards whose inputs changed. All refreshes share a global work budget (hazard pipeline calls
+# per minute) and run on a worker pool without blocking the scheduling rounds. Input probes have
+# their own budget. Every household's refresh age is jittered, so load is spread evenly instead of
+# spiking. Households nobody has read for a while are dropped.
+
+import csv
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import StringIO
+
+from weather import get_flood_risk, get_active_alerts, get_weather_data, get_forecast_data
+from earthquake import get_earthquake_risk, get_earthquake_data
+from fire import get_fire_risk, get_fire_data
+from evacuation import get_cell
+from utils import get_lat_lon
+
+HAZARD_FUNCTIONS = {
+    "flood": get_flood_risk,
+    "earthquake": get_earthquake_risk,
+    "fire": get_fire_risk,
+}
+
+MAX_AGE = 6 * 60 * 60  # Seconds after which results are considered stale
+MAX_AGE_JITTER = 0.2  # Each household refreshes between 80% and 100% of MAX_AGE
+RETRY_DELAY = 10 * 60  # Seconds to wait before retrying a failed refresh
+PROBE_INTERVAL = 15 * 60  # Seconds between hazard input probes of a geospatial cell
+PROBES_PER_MINUTE = 20  # Budget of cell probes, each makes up to four upstream requests
+MAX_CONCURRENT_PROBES = 2
+IDLE_TIMEOUT = 3 * 24 * 60 * 60  # Seconds without a read after which a household is dropped
+
+# Priority weights, added to the staleness (result age / max age). A household is refreshed
+# once its priority reaches 1.
+UPSTREAM_CHANGE_WEIGHT = 1.0
+ALERT_WEIGHT = 0.25  # Per active alert
+MAX_ALERT_WEIGHT = 0.75
+
+PROBE_USER_AGENT = "SafeHavenRiskRefresh"
+
+
+def probe_hazard_inputs(lat_lon, hazards=("flood", "earthquake", "fire"), firms_api_key=None):
+    """
+    Probes the hazard inputs for a location without calling the models: the forecast's
+    update time, the latest earthquake and the latest fire detection, plus the active alerts.
+    Args:
+        lat_lon (tuple): The location in the format (latitude, longitude).
+        hazards (tuple): The hazards whose inputs to probe.
+        firms_api_key (str): The FIRMS API key, fire inputs are not probed without it.
+    Returns:
+        tuple: A dict of hazard to input fingerprint, only for the inputs fetched successfully,
+            and the number of active alerts, or None if the alerts could not be fetched.
+    """
+    fingerprints = {}
+
+    if "flood" in hazards:
+        weather_data = get_weather_data(PROBE_USER_AGENT, lat_lon)
+        forecast_data = get_forecast_data(weather_data) if weather_data else None
+        if forecast_data:
+            fingerprints["flood"] = forecast_data.get("properties", {}).get("updated")
+
+    if "earthquake" in hazards:
+        earthquake_data = get_earthquake_data(lat_lon)
+        if earthquake_data is not None:
+            latest = max(
+                earthquake_data.get("features") or [],
+                key=lambda feature: feature.get("properties", {}).get("time") or 0,
+                default=None,
+            )
+            fingerprints["earthquake"] = None if latest is None else (
+                latest.get("id"), latest.get("properties", {}).get("updated")
+            )
+
+    if "fire" in hazards and firms_api_key:
+        fire_data = get_fire_data(firms_api_key, lat_lon)
+        if fire_data is not None:
+            # FIRMS detections have no ids, so the latest detection is identified by time and place
+            latest = max(
+                csv.DictReader(StringIO(fire_data)),
+                key=lambda row: (row.get("acq_date", ""), row.get("acq_time", "")),
+                default=None,
+            )
+            fingerprints["fire"] = None if latest is None else (
+                latest.get("acq_date"), latest.get("acq_time"), latest.get("latitude"), latest.get("longitude")
+            )
+
+    alerts = get_active_alerts(PROBE_USER_AGENT, lat_lon)
+    return fingerprints, None if alerts is None else len(alerts)
+
+
+@dataclass(slots=True)
+class HouseholdState:
+    address: str
+    lat_lon: tuple
+    cell: tuple
+    max_age: float
+    results: dict = field(default_factory=dict)
+    refreshed_at: float | None = None
+    last_read_at: float | None = None
+    retry_at: float | None = None
+    changed_hazards: set = field(default_factory=set)
+    refreshing: bool = False
+
+
+@dataclass(slots=True)
+class CellState:
+    fingerprints: dict = field(default_factory=dict)
+    alerts: int = 0
+    probed_at: float | None = None
+    probing: bool = False
+    households: set = field(default_factory=set)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled from the monotonic clock, so time spent in slow rounds still counts.
+
+    Args:
+        per_minute (float): Tokens added per minute.
+        capacity (float): Maximum number of tokens held.
+    """
+
+    def __init__(self, per_minute, capacity):
+        self.per_minute = per_minute
+        self.capacity = capacity
+        self.tokens = capacity
+        self._last_refill = time.monotonic()
+
+    def take(self, count):
+        """
+        Takes tokens from the bucket if enough are available.
+        Args:
+            count (float): The number of tokens to take.
+        Returns:
+            bool: True if the tokens were taken.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.per_minute / 60)
+        self._last_refill = now
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+
+class RiskRefreshScheduler:
+    """
+    Periodically re-runs the hazard pipeline for known households in a background thread,
+    so the UI can read fresh, precomputed results instantly.
+
+    Args:
+        openai_client (OpenAI): The OpenAI client instance.
+        gmaps_client (googlemaps.Client): The Google Maps client instance.
+        hazards (tuple): The hazards to assess, any of "flood", "earthquake" and "fire".
+        firms_api_key (str): The FIRMS API key, required when "fire" is one of the hazards.
+        budget_per_minute (float): Global budget of hazard pipeline calls per minute.
+        max_age (float): Seconds after which results are considered stale.
+        tick_interval (float): Seconds between scheduling rounds.
+        max_workers (int): Maximum number of households refreshed concurrently.
+        probes_per_minute (float): Budget of hazard input probes per minute, separate from the
+            pipeline budget.
+        idle_timeout (float): Seconds without a get_results call after which a household is dropped.
+        probe (callable): Function returning (fingerprints, alert_count) for a location, as
+            probe_hazard_inputs does. Defaults to probe_hazard_inputs for the scheduled hazards.
+    """
+
+    def __init__(
+        self,
+        openai_client,
+        gmaps_client,
+        hazards=("flood", "earthquake", "fire"),
+        firms_api_key=None,
+        budget_per_minute=30,
+        max_age=MAX_AGE,
+        tick_interval=5,
+        max_workers=4,
+        probes_per_minute=PROBES_PER_MINUTE,
+        idle_timeout=IDLE_TIMEOUT,
+        probe=None,
+    ):
+        self.openai_client = openai_client
+        self.gmaps_client = gmaps_client
+        self.hazards = tuple(hazards)
+        self.firms_api_key = firms_api_key
+        self.budget_per_minute = budget_per_minute
+        self.max_age = max_age
+        self.tick_interval = tick_interval
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        if probe is None:
+            probe = functools.partial(probe_hazard_inputs, hazards=self.hazards, firms_api_key=firms_api_key)
+        self.probe = probe
+
+        self.households = {}
+        self.cells = {}
+
+        # Budget of hazard pipeline calls, holding at most one tick's worth of work but always
+        # enough to fill every worker with a full refresh
+        self._budget = TokenBucket(
+            budget_per_minute, max(max_workers * len(self.hazards), budget_per_minute * tick_interval / 60)
+        )
+        self._probe_budget = TokenBucket(probes_per_minute, MAX_CONCURRENT_PROBES)
+
+        # Refreshes and probes are capped at the pool size, so submitted work never queues
+        self._executor = None
+        self._refreshes_in_flight = 0
+        self._probes_in_flight = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Households
+
+    def add_household(self, household_id, address, lat_lon=None, now=None):
+        """
+        Registers a household for background refreshes. Re-adding a household with a
+        new address discards its previous results.
+        Args:
+            household_id (str): A unique id for the household.
+            address (str): The household's address.
+            lat_lon (tuple): The household's location, geocoded from the address if not given.
+            now (float): The current time, defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            household = self.households.get(household_id)
+            if household is not None and household.address == address:
+                household.last_read_at = now
+                return
+
+        if lat_lon is None:
+            lat_lon = get_lat_lon(self.gmaps_client, address)
+        cell = get_cell(*lat_lon)
+
+        with self._lock:
+            if household_id in self.households:
+                self._remove_from_cell(household_id)
+
+            self.households[household_id] = HouseholdState(
+                address, lat_lon, cell, self._jittered_max_age(), last_read_at=now
+            )
+            self.cells.setdefault(cell, CellState()).households.add(household_id)
+
+    def remove_household(self, household_id):
+        """
+        Stops refreshing a household and discards its results.
+        """
+        with self._lock:
+            if household_id in self.households:
+                self._remove_from_cell(household_id)
+                del self.households[household_id]
+
+    def _remove_from_cell(self, household_id):
+        cell = self.households[household_id].cell
+        self.cells[cell].households.discard(household_id)
+        if not self.cells[cell].households:
+            del self.cells[cell]
+
+    def get_results(self, household_id, now=None):
+        """
+        Returns the precomputed risk results of a household if they are still fresh.
+        Every call counts as a read that keeps the household from being dropped.
+        Args:
+            household_id (str): The id of the household.
+            now (float): The current time, defaults to time.time().
+        Returns:
+            dict: A dictionary of hazard to RiskResult, or None if the household is unknown
+                or its results are incomplete or stale.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            household = self.households.get(household_id)
+            if household is None:
+                return None
+            household.last_read_at = now
+            if household.refreshed_at is None:
+                return None
+            if now - household.refreshed_at > self.max_age:
+                return None
+            if any(hazard not in household.results for hazard in self.hazards):
+                return None
+            return dict(household.results)
+
+    def record_results(self, household_id, results, now=None):
+        """
+        Stores results computed outside the scheduler, e.g. by a user clicking "Analyze Risk",
+        so the household is not refreshed again until they become stale.
+        Args:
+            household_id (str): The id of a registered household.
+            results (dict): A dictionary of hazard to RiskResult.
+            now (float): The current time, defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            household = self.households.get(household_id)
+            if household is None:
+                return
+            household.results.update(results)
+            household.changed_hazards.difference_update(results)
+            if all(hazard in household.results for hazard in self.hazards):
+                self._mark_refreshed(household, now)
+
+    # Scheduling
+
+    def priority(self, household_id, now=None):
+        """
+        Returns the refresh priority of a household. Households are refreshed once their priority
+        reaches 1, highest priority first.
+        Args:
+            household_id (str): The id of the household.
+            now (float): The current time, defaults to time.time().
+        Returns:
+            float: The priority, or 0 if the household is already being refreshed or waiting to retry.
+        """
+        now = time.time() if now is None else now
+        household = self.households[household_id]
+        if household.refreshing or (household.retry_at is not None and now < household.retry_at):
+            return 0.0
+
+        priority = self._staleness_priority(household, now)
+        if household.changed_hazards:
+            priority += UPSTREAM_CHANGE_WEIGHT
+        return priority
+
+    def _staleness_priority(self, household, now):
+        if household.refreshed_at is None:
+            staleness = 1.0
+        else:
+            staleness = (now - household.refreshed_at) / household.max_age
+
+        alerts = self.cells[household.cell].alerts
+        return staleness + min(alerts * ALERT_WEIGHT, MAX_ALERT_WEIGHT)
+
+    def _due_hazards(self, household, now):
+        # Due households get a full refresh, otherwise only hazards whose inputs changed are re-run
+        if self._staleness_priority(household, now) >= 1.0:
+            return self.hazards
+        return tuple(hazard for hazard in self.hazards if hazard in household.changed_hazards)
+
+    def run_once(self, now=None):
+        """
+        Runs one scheduling round: drops idle households, starts probes of the stalest cells for
+        hazard input changes, then starts refreshes of the highest priority households that are
+        due, within the work budget and the free workers. Probes and refreshes run on the worker
+        pool, so the round does not wait for them.
+        Args:
+            now (float): The current time, defaults to time.time().
+        Returns:
+            int: The number of household refreshes started.
+        """
+        now = time.time() if now is None else now
+        self._drop_idle_households(now)
+        self._probe_cells(now)
+
+        with self._lock:
+            due = sorted(
+                (
+                    (priority, household_id)
+                    for household_id in self.households
+                    if (priority := self.priority(household_id, now)) >= 1.0
+                ),
+                reverse=True,
+            )
+
+            batch = []
+            for _, household_id in due:
+                if self._refreshes_in_flight >= self.max_workers:
+                    break
+                household = self.households[household_id]
+                hazards = self._due_hazards(household, now)
+                if not hazards:
+                    continue
+                if not self._budget.take(len(hazards)):
+                    break
+                household.refreshing = True
+                household.changed_hazards.difference_update(hazards)
+                self._refreshes_in_flight += 1
+                batch.append((household_id, household.address, hazards))
+
+        for household_id, address, hazards in batch:
+            self._submit(self._refresh, household_id, address, hazards, now)
+        return len(batch)
+
+    def _submit(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers + MAX_CONCURRENT_PROBES, thread_name_prefix="risk-refresh"
+            )
+        self._executor.submit(fn, *args)
+
+    def _refresh(self, household_id, address, hazards, now):
+        results = {}
+        for hazard in hazards:
+            kwargs = {"api_key": self.firms_api_key} if hazard == "fire" else {}
+            try:
+                risk = HAZARD_FUNCTIONS[hazard](self.openai_client, self.gmaps_client, address, **kwargs)
+            except Exception as err:
+                print(f"Error refreshing {hazard} risk for {household_id}: {err!r}")
+                risk = None
+            if risk is not None:
+                results[hazard] = risk
+
+        with self._lock:
+            self._refreshes_in_flight -= 1
+            household = self.households.get(household_id)
+            if household is None or household.address != address:
+                return  # Removed or changed while refreshing
+
+            household.refreshing = False
+            household.results.update(results)
+            failed = [hazard for hazard in hazards if hazard not in results]
+            if failed:
+                household.changed_hazards.update(failed)
+                household.retry_at = now + RETRY_DELAY
+            elif len(hazards) == len(self.hazards):
+                self._mark_refreshed(household, now)
+            else:
+                household.retry_at = None
+
+    def _mark_refreshed(self, household, now):
+        household.refreshed_at = now
+        household.max_age = self._jittered_max_age()
+        household.retry_at = None
+
+    def _jittered_max_age(self):
+        return self.max_age * random.uniform(1.0 - MAX_AGE_JITTER, 1.0)
+
+    def _drop_idle_households(self, now):
+        with self._lock:
+            idle = [
+                household_id
+                for household_id, household in self.households.items()
+                if now - household.last_read_at > self.idle_timeout
+            ]
+            for household_id in idle:
+                self._remove_from_cell(household_id)
+                del self.households[household_id]
+
+    def _probe_cells(self, now):
+        with self._lock:
+            due = sorted(
+                (cell.probed_at or 0.0, key, self.households[next(iter(cell.households))].lat_lon)
+                for key, cell in self.cells.items()
+                if not cell.probing and (cell.probed_at is None or now - cell.probed_at >= PROBE_INTERVAL)
+            )
+
+            batch = []
+            for _, key, lat_lon in due:
+                if self._probes_in_flight >= MAX_CONCURRENT_PROBES or not self._probe_budget.take(1):
+                    break
+                self.cells[key].probing = True
+                self._probes_in_flight += 1
+                batch.append((key, lat_lon))
+
+        for key, lat_lon in batch:
+            self._submit(self._probe_cell, key, lat_lon, now)
+
+    def _probe_cell(self, key, lat_lon, now):
+        try:
+            probe_result = self.probe(lat_lon)
+        except Exception as err:
+            print(f"Error probing hazard inputs for cell {key}: {err!r}")
+            probe_result = None
+
+        with self._lock:
+            self._probes_in_flight -= 1
+            cell = self.cells.get(key)
+            if cell is None:
+                return
+            cell.probing = False
+            cell.probed_at = now
+            if probe_result is None:
+                return
+
+            # Only inputs fetched in both this and an earlier probe are compared,
+            # so a failed fetch is never mistaken for a change
+            fingerprints, alerts = probe_result
+            changed = {
+                hazard
+                for hazard, fingerprint in fingerprints.items()
+                if hazard in self.hazards and hazard in cell.fingerprints and cell.fingerprints[hazard] != fingerprint
+            }
+            if changed:
+                for household_id in cell.households:
+                    self.households[household_id].changed_hazards.update(changed)
+            cell.fingerprints.update(fingerprints)
+            if alerts is not None:
+                cell.alerts = alerts
+
+    # Lifecycle
+
+    def start(self):
+        """
+        Starts the scheduler in a background daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="risk-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread after its current round. Refreshes and probes already
+        running finish in the background.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as err:
+                print(f"Error in risk refresh round: {err!r}")
+            self._stop.wait(self.tick_interval)
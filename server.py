@@ -0,0 +1,359 @@
+# Contains the headless HTTP service that exposes the risk and checklist functions as JSON endpoints.
+#
+# The service is stateless: every request carries everything needed to answer it, so any number of
+# replicas can run behind a load balancer. Run it with:
+#     python server.py --host 0.0.0.0 --port 8080
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+from http import HTTPStatus
+
+from weather import get_flood_risk
+from earthquake import get_earthquake_risk
+from fire import get_fire_risk
+from preparedness import generate_preparation_checklist, calculate_preparedness_score
+from models import ChecklistTask, UserProfile
+from utils import GeocodingError
+
+MAX_BODY_SIZE = 1024 * 1024  # 1 MiB
+MAX_HEADER_COUNT = 100
+KEEP_ALIVE_TIMEOUT = 15  # Seconds an idle connection is kept open
+DRAIN_GRACE_PERIOD = 10  # Seconds /readyz fails on shutdown before new connections are refused
+DRAIN_TIMEOUT = 30  # Seconds to wait for in-flight requests on shutdown
+
+
+class HTTPError(Exception):
+    """
+    Raised by request handlers to return an error response to the client.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RiskService:
+    """
+    Stateless asyncio HTTP service for the risk assessment and preparedness checklist functions.
+
+    Args:
+        openai_client (OpenAI): The OpenAI client instance.
+        gmaps_client (googlemaps.Client): The Google Maps client instance.
+        firms_api_key (str): The FIRMS API key used for fire risk assessment.
+        max_concurrency (int): Maximum number of blocking pipeline calls running at once.
+        drain_grace_period (float): Seconds /readyz fails on shutdown, while requests are still
+            served, so load balancers can stop routing to this replica.
+        drain_timeout (float): Seconds to wait for in-flight requests when shutting down.
+    """
+
+    def __init__(
+        self,
+        openai_client,
+        gmaps_client,
+        firms_api_key=None,
+        max_concurrency=16,
+        drain_grace_period=DRAIN_GRACE_PERIOD,
+        drain_timeout=DRAIN_TIMEOUT,
+    ):
+        self.openai_client = openai_client
+        self.gmaps_client = gmaps_client
+        self.firms_api_key = firms_api_key
+        self.drain_grace_period = drain_grace_period
+        self.drain_timeout = drain_timeout
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._server = None
+        self._draining = False  # Readiness fails, requests are still served
+        self._closing = False  # The listener is closed, new requests are rejected
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._idle_writers = set()
+
+        self.routes = {
+            ("GET", "/healthz"): self.handle_health,
+            ("GET", "/readyz"): self.handle_ready,
+            ("POST", "/v1/risk/flood"): self.handle_flood_risk,
+            ("POST", "/v1/risk/earthquake"): self.handle_earthquake_risk,
+            ("POST", "/v1/risk/fire"): self.handle_fire_risk,
+            ("POST", "/v1/checklist"): self.handle_checklist,
+            ("POST", "/v1/score"): self.handle_score,
+        }
+
+    # Handlers
+
+    async def handle_health(self, body):
+        return HTTPStatus.OK, {"status": "ok"}
+
+    async def handle_ready(self, body):
+        if self._draining:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"status": "draining"}
+        return HTTPStatus.OK, {"status": "ready"}
+
+    async def handle_flood_risk(self, body):
+        return await self._assess_risk("flood", get_flood_risk, body)
+
+    async def handle_earthquake_risk(self, body):
+        return await self._assess_risk("earthquake", get_earthquake_risk, body)
+
+    async def handle_fire_risk(self, body):
+        if not self.firms_api_key:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Fire risk is not available: FIRMS_MAP_KEY is not configured.")
+        return await self._assess_risk("fire", get_fire_risk, body, api_key=self.firms_api_key)
+
+    async def handle_checklist(self, body):
+        try:
+            user_profile = UserProfile.from_dict(_require_field(body, "user_profile", dict))
+        except (TypeError, ValueError) as err:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid user profile: {err}")
+
+        checklist = await self._run_blocking(generate_preparation_checklist, self.openai_client, user_profile)
+        if checklist is None:
+            raise HTTPError(HTTPStatus.BAD_GATEWAY, "The model did not return a checklist.")
+        return HTTPStatus.OK, {"checklist": [task.to_dict() for task in checklist]}
+
+    async def handle_score(self, body):
+        try:
+            tasks = [ChecklistTask.from_dict(task) for task in _require_field(body, "tasks", list)]
+            score = calculate_preparedness_score(tasks)
+        except (TypeError, ValueError) as err:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Each task needs 'task', 'is_done' and integer 'weight' fields: {err}")
+        return HTTPStatus.OK, {"score": score}
+
+    async def _assess_risk(self, hazard, risk_function, body, **kwargs):
+        address = _require_field(body, "address", str)
+        try:
+            risk = await self._run_blocking(risk_function, self.openai_client, self.gmaps_client, address, **kwargs)
+        except GeocodingError as err:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, str(err))
+
+        if risk is None:
+            raise HTTPError(HTTPStatus.BAD_GATEWAY, f"Could not assess {hazard} risk for the provided address.")
+        return HTTPStatus.OK, risk.to_dict()
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        # The pipeline functions do blocking network I/O, so run them on worker threads
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    # HTTP handling
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves HTTP/1.1 requests on a single connection until the client closes it,
+        the keep-alive timeout expires or the service starts draining.
+        """
+        try:
+            while not self._closing:
+                self._idle_writers.add(writer)
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as err:
+                    await self._write_response(writer, err.status, {"error": err.message}, keep_alive=False)
+                    break
+                finally:
+                    self._idle_writers.discard(writer)
+
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                # The request stays in flight until its response is fully written,
+                # so draining never cuts a response short
+                self._request_started()
+                try:
+                    status, payload = await self._dispatch(method, path, body)
+                    keep_alive = headers.get("connection", "").lower() != "close" and not self._draining
+                    await self._write_response(writer, status, payload, keep_alive)
+                finally:
+                    self._request_finished()
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Method {method} not allowed for {path}."}
+            return HTTPStatus.NOT_FOUND, {"error": f"No route for {path}."}
+
+        if self._closing and path not in ("/healthz", "/readyz"):
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Service is draining."}
+
+        try:
+            data = {}
+            if method == "POST":
+                try:
+                    data = json.loads(body or b"{}")
+                except (UnicodeDecodeError, json.JSONDecodeError) as err:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, f"Request body is not valid JSON: {err}")
+                if not isinstance(data, dict):
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+            return await handler(data)
+
+        except HTTPError as err:
+            return err.status, {"error": err.message}
+        except Exception as err:
+            print(f"Unhandled error while serving {method} {path}: {err!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."}
+
+    async def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _request_started(self):
+        self._in_flight += 1
+        self._idle.clear()
+
+    def _request_finished(self):
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+    # Lifecycle
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server
+
+    async def drain(self):
+        """
+        Gracefully drains the service: readiness fails for the grace period while requests are
+        still served, then no new connections are accepted, idle keep-alive connections are
+        closed and in-flight requests are given time to finish.
+        """
+        if self._draining:
+            return
+        self._draining = True
+        await asyncio.sleep(self.drain_grace_period)
+
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+
+        for writer in list(self._idle_writers):
+            writer.close()
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Drain timed out with {self._in_flight} request(s) still in flight.")
+
+    async def serve_forever(self, host="127.0.0.1", port=8080):
+        """
+        Serves requests until SIGTERM or SIGINT is received, then drains and exits.
+        """
+        await self.start(host, port)
+        print(f"Serving on http://{host}:{port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        await stop.wait()
+        print("Shutdown requested, draining...")
+        await self.drain()
+
+
+async def _read_request(reader):
+    """
+    Reads a single HTTP/1.1 request from the stream.
+
+    Returns:
+        tuple: (method, path, headers, body), or None if the connection was closed before a request line.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADER_COUNT:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers.")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked request bodies are not supported.")
+
+    try:
+        content_length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length header.")
+    if content_length > MAX_BODY_SIZE:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large.")
+
+    body = await reader.readexactly(content_length) if content_length > 0 else b""
+    return method.upper(), path, headers, body
+
+
+def _require_field(body, field, expected_type):
+    value = body.get(field)
+    if not isinstance(value, expected_type):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Field '{field}' is required and must be of type {expected_type.__name__}.")
+    return value
+
+
+def create_service(max_concurrency=16, drain_grace_period=DRAIN_GRACE_PERIOD, drain_timeout=DRAIN_TIMEOUT):
+    """
+    Creates a RiskService with API clients configured from environment variables
+    (OPENAI_API_KEY, GOOGLE_MAPS_API_KEY and optionally FIRMS_MAP_KEY).
+    """
+    from openai import OpenAI
+    import googlemaps
+
+    openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    gmaps_client = googlemaps.Client(key=os.environ["GOOGLE_MAPS_API_KEY"])
+    return RiskService(
+        openai_client,
+        gmaps_client,
+        firms_api_key=os.environ.get("FIRMS_MAP_KEY"),
+        max_concurrency=max_concurrency,
+        drain_grace_period=drain_grace_period,
+        drain_timeout=drain_timeout,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SafeHaven risk and checklist HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--drain-grace-period", type=float, default=DRAIN_GRACE_PERIOD)
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    args = parser.parse_args()
+
+    async def main():
+        service = create_service(args.max_concurrency, args.drain_grace_period, args.drain_timeout)
+        await service.serve_forever(args.host, args.port)
+
+    asyncio.run(main())
@@ -1,5 +1,11 @@
 # Contains utility functions that is shared across the application.
 
+class GeocodingError(ValueError):
+    """
+    Raised when an address cannot be geocoded.
+    """
+
+
 def get_lat_lon(gmaps_client, address):
     """
     Returns the corresponding latitude and longitude for a given address.
@@ -8,6 +14,8 @@ def get_lat_lon(gmaps_client, address):
         address (str): The address to geocode.
     Returns:
         tuple: A tuple containing the latitude and longitude of the address.
+    Raises:
+        GeocodingError: If the address cannot be geocoded.
     """
     geocode_result = gmaps_client.geocode(address)
 
@@ -16,7 +24,7 @@ def get_lat_lon(gmaps_client, address):
         lon = geocode_result[0]['geometry']['location']['lng']
         return (lat, lon)
     else:
-        raise ValueError("Geocoding failed. Please check the address provided.")
+        raise GeocodingError("Geocoding failed. Please check the address provided.")
     
 
 def get_color_risk_level(value):
@@ -3,8 +3,14 @@
 import requests
 from requests.exceptions import HTTPError, Timeout, RequestException
 from utils import get_lat_lon
+from llm import request_risk_assessment
 
 BASE_URL = "https://api.weather.gov"
+REQUEST_TIMEOUT = 10  # Seconds to wait for the API before giving up
+
+HARD_PRECIPITATION_CHANCE = 40  # Percent chance of precipitation that makes the assessment ambiguous
+HARD_PERIODS = 4  # Number of upcoming forecast periods (about two days) checked for flood signals
+FLOOD_KEYWORDS = ("flood", "heavy rain", "storm surge")
 
 
 def get_weather_data(user_agent, location):
@@ -25,7 +31,8 @@ def get_weather_data(user_agent, location):
         endpoint = f"{BASE_URL}/points/{location[0]},{location[1]}"
         response = requests.get(
                        endpoint, 
-                       headers=headers
+                       headers=headers,
+                       timeout=REQUEST_TIMEOUT
                    )
         # Raise HTTPError for bad responses (4xx or 5xx)
         response.raise_for_status()
@@ -41,6 +48,72 @@ def get_weather_data(user_agent, location):
     return None  # Return None if an error occurred
     
 
+def get_active_alerts(user_agent, location):
+    """
+    Fetches the active weather alerts for a given location using the National Weather Service API.
+    
+    Args:
+        user_agent (str): User agent string for the request.
+        location (tuple): The location for which to fetch the alerts. In the format (latitude, longitude).
+        
+    Returns:
+        list: The active alerts as GeoJSON features if successful, None otherwise.
+    """
+    headers = {
+        "User-Agent": user_agent,
+    }
+
+    try:
+        endpoint = f"{BASE_URL}/alerts/active"
+        response = requests.get(
+                       endpoint,
+                       headers=headers,
+                       params={"point": f"{location[0]},{location[1]}"},
+                       timeout=REQUEST_TIMEOUT
+                   )
+        # Raise HTTPError for bad responses (4xx or 5xx)
+        response.raise_for_status()
+        return response.json().get("features", [])
+
+    except HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err} - Status code: {response.status_code}")
+    except Timeout as timeout_err:
+        print(f"Request timed out: {timeout_err}")
+    except RequestException as req_err:
+        print(f"Request error: {req_err}")
+
+    return None  # Return None if an error occurred
+
+
+def get_forecast_data(weather_data):
+    """
+    Fetches the forecast linked from the weather data returned by get_weather_data.
+    
+    Args:
+        weather_data (dict): The weather data for a location.
+        
+    Returns:
+        dict: Forecast data if successful, None otherwise.
+    """
+    forecast_url = weather_data.get("properties", {}).get("forecast", None)
+    if not forecast_url:
+        return None
+
+    try:
+        forecast_response = requests.get(forecast_url, timeout=REQUEST_TIMEOUT)
+        forecast_response.raise_for_status()
+        return forecast_response.json()
+
+    except HTTPError as http_err:
+        print(f"HTTP error occurred while fetching forecast: {http_err}")
+    except Timeout as timeout_err:
+        print(f"Forecast request timed out: {timeout_err}")
+    except RequestException as req_err:
+        print(f"Request error while fetching forecast: {req_err}")
+
+    return None  # Return None if an error occurred
+
+
 def get_flood_risk(openai_client, gmaps_client, address):
     """
     Returns the flood risk for a given address.
@@ -50,7 +123,7 @@ def get_flood_risk(openai_client, gmaps_client, address):
         address (str): The address for the model to assess for flood risk.
         
     Returns:
-        str: A message indicating the flood risk level.
+        RiskResult: The assessed flood risk, or None if it could not be assessed.
     """
     system_prompt = """
     You are an expert in flood risk assessment. Provided the data below, determine
@@ -71,46 +144,62 @@ def get_flood_risk(openai_client, gmaps_client, address):
 
     if weather_data:
         # Prepare the data for the OpenAI model
-        forecast_url = weather_data.get("properties", {}).get("forecast", None)
-        if forecast_url:
-            try:
-                forecast_response = requests.get(forecast_url)
-                forecast_response.raise_for_status()
-                forecast_data = forecast_response.json()
-            except HTTPError as http_err:
-                print(f"HTTP error occurred while fetching forecast: {http_err}")
-                forecast_data = {"properties": {"forecast": "No forecast data available."}}
-            except RequestException as req_err:
-                print(f"Request error while fetching forecast: {req_err}")
-                forecast_data = {"properties": {"forecast": "No forecast data available."}}
+        forecast_data = get_forecast_data(weather_data) or {"properties": {"forecast": "No forecast data available."}}
+
+        # Only the text and precipitation chance of each period are sent, nearest periods first
+        periods = forecast_data.get("properties", {}).get("periods") or []
+        forecast_periods = [
+            f"{period.get('name', 'Unknown period')}: {period.get('detailedForecast') or period.get('shortForecast', '')} "
+            f"(Chance of precipitation: {_precipitation_chance(period)}%)"
+            for period in periods
+        ]
+        if not forecast_periods:
+            forecast_periods = ["No forecast data available."]
 
         location_info = f"Location: {lat}, {lon}"
         
-        # Combine the prompt with the weather summary and location info
-        user_prompt = f"{location_info}\n\nForecast Data: {forecast_data}"
+        # Combine the location info with the forecast periods
+        header = f"{location_info}\n\nForecast Data:"
 
         # Call the OpenAI model to get the flood risk assessment
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=500,
+        return request_risk_assessment(
+            openai_client,
+            "flood",
+            system_prompt,
+            header,
+            forecast_periods,
+            is_hard=is_flood_assessment_hard(periods),
             temperature=0.7,
+            summarize=_summarize_omitted_periods,
         )
 
-        # Extract and format the response
-        if response and response.choices:
-            response_content = response.choices[0].message.content.strip()
-
-            if "Risk Level:" in response_content and "Explanation:" in response_content:
-                risk_level = response_content.split("Risk Level:")[1].split("\n")[0].strip()
-                explanation = response_content.split("Explanation:")[1].strip()
-                return f"Risk Level: {risk_level}\nExplanation: {explanation}"
-            
-            else:
-                return None
-            
-        else:
-            return None
\ No newline at end of file
+
+def is_flood_assessment_hard(periods):
+    """
+    Returns whether the upcoming forecast is ambiguous or indicates a high flood risk.
+    Only the next few periods are checked: a forecast with low chances of precipitation
+    and no mention of flooding, heavy rain or storm surge is a clear signal that the
+    small model can assess.
+
+    Args:
+        periods (list): The forecast periods returned by the NWS forecast endpoint.
+    Returns:
+        bool: True if the assessment should go to the large model.
+    """
+    for period in periods[:HARD_PERIODS]:
+        if _precipitation_chance(period) >= HARD_PRECIPITATION_CHANCE:
+            return True
+
+        forecast_text = f"{period.get('shortForecast', '')} {period.get('detailedForecast', '')}".lower()
+        if any(keyword in forecast_text for keyword in FLOOD_KEYWORDS):
+            return True
+
+    return False
+
+
+def _precipitation_chance(period):
+    return (period.get("probabilityOfPrecipitation") or {}).get("value") or 0
+
+
+def _summarize_omitted_periods(omitted):
+    return f"... and {len(omitted)} later forecast periods omitted."